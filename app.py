@@ -5,10 +5,12 @@ from logging.handlers import RotatingFileHandler
 from dotenv import load_dotenv
 from services.nexar_service import process_all_mpn
 from flask_cors import CORS
-from flask import Flask, request, jsonify
-from redis_config import task_queue, redis_conn
+from flask import Flask, request, jsonify, send_file
+from redis_config import task_queue, redis_conn, RESULT_TTL
 from rq.job import Job
 from services.nexar_service import run_nexar_task
+from services.fx_service import known_currencies
+from services.export_service import EXPORT_FORMATS, parse_columns, cached_export, build_export
 
 load_dotenv()
 
@@ -122,10 +124,18 @@ def submit_task():
     mode = data.get("mode", "full")
     rows = data.get("data", [])
     q_param = data.get("q")
+    currency = data.get("currency")
 
     if not rows and not q_param:
         return jsonify({"error": "Нет данных или параметра 'q'"}), 400
 
+    if currency is not None:
+        if not isinstance(currency, str) or len(currency) != 3 or not currency.isascii() or not currency.isalpha():
+            return jsonify({"error": "Параметр 'currency' должен быть кодом валюты ISO 4217 (например, RUB)"}), 400
+        currency = currency.upper()
+        if currency not in known_currencies(app.logger):
+            return jsonify({"error": f"Курс для валюты '{currency}' недоступен"}), 400
+
     mpn_list = []
 
     if rows:
@@ -173,7 +183,9 @@ def submit_task():
             run_nexar_task,
             mpn_list,
             mode,
-            job_timeout='2h'
+            currency,
+            job_timeout='2h',
+            result_ttl=RESULT_TTL
         )
 
         return jsonify({
@@ -207,6 +219,52 @@ def get_task_status(task_id):
 
     return jsonify({"status": job.get_status()}), 200
 
+
+# Эндпоинт для выгрузки результатов задачи в CSV/XLSX/Parquet
+@app.route('/api/v1/export/<task_id>', methods=['GET'])
+def export_task_results(task_id):
+    fmt = request.args.get("format", "csv").lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"Неподдерживаемый формат. Допустимые: {', '.join(EXPORT_FORMATS)}"}), 400
+
+    try:
+        columns = parse_columns(request.args.get("columns"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        job = Job.fetch(task_id, connection=redis_conn)
+    except Exception:
+        return jsonify({"status": "NOT_FOUND"}), 404
+
+    if job.is_failed:
+        return jsonify({"status": "FAILED", "error": str(job.exc_info)}), 500
+
+    if not job.is_finished:
+        return jsonify({"status": job.get_status(), "error": "Задача ещё не завершена"}), 409
+
+    # Готовый файл отдаём без загрузки результата задачи из Redis
+    path = cached_export(task_id, fmt, columns, RESULT_TTL)
+    if path is None:
+        result = job.result
+        if isinstance(result, dict):
+            if result.get("status") == "FAILED":
+                return jsonify({"status": "FAILED", "error": result.get("error")}), 500
+            result = result.get("result")
+
+        try:
+            path = build_export(task_id, result or [], fmt, columns)
+        except Exception as e:
+            app.logger.error(f"Ошибка при формировании выгрузки {task_id} ({fmt}): {e}", exc_info=True)
+            return jsonify({"error": "Не удалось сформировать выгрузку"}), 500
+
+    return send_file(
+        os.path.abspath(path),
+        mimetype=EXPORT_FORMATS[fmt],
+        as_attachment=True,
+        download_name=f"bom_{task_id}.{fmt}"
+    )
+
 if __name__ == '__main__':
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", 5003))
@@ -10,6 +10,8 @@ load_dotenv()
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_DB = int(os.getenv("REDIS_DB", 1))
+# Сколько секунд результат задачи хранится в Redis (столько же живут выгрузки)
+RESULT_TTL = int(os.getenv("RESULT_TTL", 24 * 3600))
 
 print(f"Попытка подключения к Redis: {REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}")
 
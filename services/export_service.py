@@ -0,0 +1,197 @@
+import os
+import csv
+import time
+import hashlib
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", "exports")
+# Сколько строк копится в памяти перед записью (row group для Parquet)
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 5000))
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Плоская схема выгрузки: одна строка на ценовую ступень оффера.
+# Тип нужен для Parquet (имя фабрики типа в pyarrow).
+EXPORT_COLUMNS = {
+    "requested_mpn": "string",
+    "mpn": "string",
+    "manufacturer": "string",
+    "manufacturer_id": "string",
+    "seller_id": "string",
+    "seller_name": "string",
+    "seller_verified": "bool_",
+    "seller_homepageUrl": "string",
+    "stock": "int64",
+    "price": "float64",
+    "currency": "string",
+    "price_converted": "float64",
+    "currency_converted": "string",
+    "break_quantity": "int64",
+    "break_price": "float64",
+    "break_currency": "string",
+    "break_price_converted": "float64",
+    "break_currency_converted": "string",
+    "break_target_price_purchasing": "float64",
+    "break_cost_with_delivery": "float64",
+    "break_target_price_sales": "float64",
+    "category_id": "string",
+    "category_name": "string",
+    "image_url": "string",
+    "description": "string",
+    "requested_quantity": "int64",
+    "status": "string",
+}
+
+_BREAK_FIELDS = [
+    "quantity",
+    "price",
+    "currency",
+    "price_converted",
+    "currency_converted",
+    "target_price_purchasing",
+    "cost_with_delivery",
+    "target_price_sales",
+]
+
+
+def parse_columns(columns_param):
+    """Разбирает параметр columns ("a,b,c"). Возвращает список колонок или ValueError."""
+    if not columns_param:
+        return list(EXPORT_COLUMNS)
+
+    # Повторы убираются с сохранением порядка: Parquet не читается с одинаковыми именами полей
+    columns = list(dict.fromkeys(c.strip() for c in columns_param.split(",") if c.strip()))
+    unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Неизвестные колонки: {', '.join(unknown)}")
+    if not columns:
+        raise ValueError("Список колонок пуст")
+    return columns
+
+
+def iter_flat_rows(records):
+    """Разворачивает записи process_all_mpn/process_part: по строке на каждую ступень priceBreaks."""
+    for record in records:
+        base = {k: v for k, v in record.items() if k != "priceBreaks"}
+        price_breaks = record.get("priceBreaks") or []
+
+        if not price_breaks:
+            yield base
+            continue
+
+        for price_break in price_breaks:
+            row = dict(base)
+            for field in _BREAK_FIELDS:
+                row[f"break_{field}"] = price_break.get(field)
+            yield row
+
+
+def _chunks(rows, columns, size=EXPORT_CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append([row.get(c) for c in columns])
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _write_csv(path, rows, columns):
+    # utf-8-sig — чтобы Excel корректно открывал кириллицу
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for chunk in _chunks(rows, columns):
+            writer.writerows(chunk)
+
+
+def _write_xlsx(path, rows, columns):
+    from openpyxl import Workbook
+
+    # write_only: строки сбрасываются на диск по мере добавления
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("results")
+    ws.append(columns)
+    for chunk in _chunks(rows, columns):
+        for row in chunk:
+            ws.append(row)
+    wb.save(path)
+
+
+def _write_parquet(path, rows, columns):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(c, getattr(pa, EXPORT_COLUMNS[c])()) for c in columns])
+    with pq.ParquetWriter(path, schema, compression="snappy") as writer:
+        for chunk in _chunks(rows, columns):
+            arrays = [pa.array([row[i] for row in chunk], type=schema.field(i).type) for i in range(len(columns))]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+
+_WRITERS = {
+    "csv": _write_csv,
+    "xlsx": _write_xlsx,
+    "parquet": _write_parquet,
+}
+
+
+def export_path(task_id, fmt, columns):
+    digest = hashlib.sha1(",".join(columns).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(EXPORT_CACHE_DIR, f"{task_id}_{digest}.{fmt}")
+
+
+def cleanup_exports(max_age):
+    """Удаляет выгрузки старше max_age секунд — к этому времени результат задачи уже удалён из Redis."""
+    if not os.path.isdir(EXPORT_CACHE_DIR):
+        return
+
+    expire_before = time.time() - max_age
+    for name in os.listdir(EXPORT_CACHE_DIR):
+        path = os.path.join(EXPORT_CACHE_DIR, name)
+        try:
+            if os.path.getmtime(path) < expire_before:
+                os.remove(path)
+        except OSError:
+            # Файл уже удалён параллельным запросом
+            pass
+
+
+def cached_export(task_id, fmt, columns, max_age):
+    """
+    Возвращает путь к готовой выгрузке или None.
+    Результат задачи не меняется после завершения, поэтому файл кешируется по task_id/формату/колонкам
+    на max_age секунд (время жизни результата задачи в Redis).
+    """
+    cleanup_exports(max_age)
+
+    path = export_path(task_id, fmt, columns)
+    return path if os.path.exists(path) else None
+
+
+def build_export(task_id, records, fmt, columns):
+    """Пишет выгрузку на диск порциями и возвращает путь к файлу."""
+    path = export_path(task_id, fmt, columns)
+    # Файл мог появиться, пока загружался результат задачи (параллельный запрос)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    # Уникальное имя на каждый вызов: параллельные запросы пишут в разные файлы
+    fd, tmp_path = tempfile.mkstemp(dir=EXPORT_CACHE_DIR, suffix=f".{fmt}.tmp")
+    os.close(fd)
+    try:
+        _WRITERS[fmt](tmp_path, iter_flat_rows(records), columns)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
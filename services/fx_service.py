@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import logging
+import threading
+import requests
+from dotenv import load_dotenv
+from redis_config import redis_conn
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Конфигурация курсов валют ---
+
+FX_API_URL = os.getenv("FX_API_URL", "https://api.exchangerate.host/latest?base=USD")
+FX_REFRESH_INTERVAL = int(os.getenv("FX_REFRESH_INTERVAL", 6 * 3600))
+# Курсы старше этого возраста считаются устаревшими (но всё ещё используются, см. get_rates)
+FX_MAX_AGE = int(os.getenv("FX_MAX_AGE", 24 * 3600))
+
+# Пауза перед повторной попыткой после неудачного обновления
+FX_RETRY_INTERVAL = min(FX_REFRESH_INTERVAL, 300)
+
+FX_RATES_KEY = "fx:rates"
+FX_LOCK_KEY = "fx:refresh_lock"
+
+BASE_CURRENCY = "USD"
+
+# Последний рубеж: используется, только если в Redis нет ни одного курса
+FALLBACK_RATES = {
+    "USD": 1.0,
+    "RUB": float(os.getenv("FX_FALLBACK_USD_RUB", 100.0)),
+}
+
+
+def fetch_rates():
+    """Запрашивает курсы у внешнего провайдера. Возвращает {валюта: единиц за 1 USD}."""
+    r = requests.get(FX_API_URL, timeout=5)
+    r.raise_for_status()
+    rates = r.json()["rates"]
+    rates = {code.upper(): float(value) for code, value in rates.items() if value}
+    rates[BASE_CURRENCY] = 1.0
+    return rates
+
+
+def refresh_rates():
+    """Обновляет курсы в Redis. Возвращает True, если курсы записаны."""
+    try:
+        rates = fetch_rates()
+    except Exception as e:
+        logger.error(f"Ошибка при получении курсов валют: {e}")
+        return False
+
+    payload = {"base": BASE_CURRENCY, "rates": rates, "updated_at": time.time()}
+    redis_conn.set(FX_RATES_KEY, json.dumps(payload))
+    logger.info(f"Курсы валют обновлены в Redis: {len(rates)} валют, USD→RUB={rates.get('RUB')}")
+    return True
+
+
+def _refresh_loop(stop_event):
+    while not stop_event.is_set():
+        # Блокировка в Redis: при нескольких воркерах курс обновляет только один
+        try:
+            if redis_conn.set(FX_LOCK_KEY, "1", nx=True, ex=FX_REFRESH_INTERVAL):
+                if not refresh_rates():
+                    # Не удалось — повторяем раньше, но не чаще FX_RETRY_INTERVAL
+                    redis_conn.set(FX_LOCK_KEY, "1", ex=FX_RETRY_INTERVAL)
+        except Exception as e:
+            logger.error(f"Ошибка фонового обновления курсов: {e}")
+        stop_event.wait(60)
+
+
+def start_fx_refresher():
+    """Запускает фоновый поток обновления курсов. Возвращает Event для остановки."""
+    stop_event = threading.Event()
+    thread = threading.Thread(target=_refresh_loop, args=(stop_event,), name="fx-refresher", daemon=True)
+    thread.start()
+    return stop_event
+
+
+def get_rates(logger=logger):
+    """
+    Возвращает курсы из Redis (без обращения к внешнему API).
+
+    Политика fallback:
+      1. актуальные курсы из Redis;
+      2. устаревшие курсы из Redis (с предупреждением в логе);
+      3. FALLBACK_RATES, если в Redis курсов нет или Redis недоступен.
+    """
+    try:
+        raw = redis_conn.get(FX_RATES_KEY)
+    except Exception as e:
+        logger.error(f"Не удалось прочитать курсы валют из Redis: {e}")
+        raw = None
+
+    if not raw:
+        logger.warning("Курсы валют в Redis отсутствуют, используются резервные курсы")
+        return dict(FALLBACK_RATES)
+
+    try:
+        payload = json.loads(raw)
+        rates = payload["rates"]
+        updated_at = float(payload.get("updated_at", 0))
+        if not isinstance(rates, dict):
+            raise TypeError("ожидался словарь курсов")
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        logger.error(f"Повреждённые курсы валют в Redis ({FX_RATES_KEY}): {e}, используются резервные курсы")
+        return dict(FALLBACK_RATES)
+
+    age = time.time() - updated_at
+    if age > FX_MAX_AGE:
+        logger.warning(f"Курсы валют устарели ({int(age // 3600)} ч.), используются последние сохранённые")
+    return rates
+
+
+def known_currencies(logger=logger):
+    """Коды валют, для которых есть курс (из Redis или резервные)."""
+    return set(get_rates(logger)) | set(FALLBACK_RATES)
+
+
+def convert(amount, from_currency, to_currency, rates):
+    """Переводит сумму между валютами через USD. Возвращает None, если курс неизвестен."""
+    if amount is None:
+        return None
+
+    from_currency = (from_currency or BASE_CURRENCY).upper()
+    to_currency = to_currency.upper()
+    if from_currency == to_currency:
+        return amount
+
+    from_rate = rates.get(from_currency)
+    to_rate = rates.get(to_currency)
+    if not from_rate or not to_rate:
+        return None
+
+    return amount / from_rate * to_rate
@@ -1,14 +1,16 @@
 import os
-import time
 import asyncio
 from api.NexarClient import NexarClient
-import requests
+from services.fx_service import BASE_CURRENCY, get_rates, convert
 from dotenv import load_dotenv
 import logging
 
 load_dotenv()
 
-async def process_all_mpn(mpn_list, mode, logger, chunk_size=15, max_retries=3):
+# Валюта, в которую переводятся цены в режиме short, если клиент не указал другую
+DEFAULT_SHORT_CURRENCY = "RUB"
+
+async def process_all_mpn(mpn_list, mode, logger, currency=None, chunk_size=15, max_retries=3):
     clientId = os.getenv("CLIENT_ID")
     clientSecret = os.getenv("CLIENT_SECRET")
     nexar = NexarClient(clientId, clientSecret)
@@ -128,6 +130,12 @@ async def process_all_mpn(mpn_list, mode, logger, chunk_size=15, max_retries=3):
                 if mpn_found in data["results"]:
                     break
 
+    target_currency = currency or (DEFAULT_SHORT_CURRENCY if mode == "short" else None)
+    rates = None
+    if target_currency or has_foreign_currency(mapping):
+        # Курсы читаются из Redis (обновляются фоновым потоком воркера), без внешних запросов
+        rates = await asyncio.to_thread(get_rates, logger)
+
     for requested_mpn, data in mapping.items():
         qty = data["quantity"]
 
@@ -145,23 +153,24 @@ async def process_all_mpn(mpn_list, mode, logger, chunk_size=15, max_retries=3):
                 original_mpn=requested_mpn,
                 found_mpn=found_mpn,
                 ALLOWED_SELLERS=ALLOWED_SELLERS,
-                requested_quantity=qty
+                requested_quantity=qty,
+                target_currency=target_currency,
+                rates=rates
             )
             output_data.extend(rows)
 
     if mode == "short":
-        rate = get_usd_to_rub_rate(logger)
         short_output = []
         for item in output_data:
-            price_rub = round(item["price"] * rate, 2) if item.get("price") else None
+            price_converted = item.get("price_converted")
             short_output.append({
                 "requested_mpn": item["requested_mpn"],
                 "mpn": item.get("mpn"),
                 "manufacturer": item.get("manufacturer"),
                 "requested_quantity": item.get("requested_quantity"),
                 "stock": item.get("stock"),
-                "price": price_rub,
-                "currency": "RUB" if price_rub else None,
+                "price": price_converted,
+                "currency": target_currency if price_converted is not None else None,
                 "status": item.get("status")
             })
         output_data = short_output
@@ -169,7 +178,18 @@ async def process_all_mpn(mpn_list, mode, logger, chunk_size=15, max_retries=3):
     return output_data
 
 
-def process_part(part, original_mpn, found_mpn, ALLOWED_SELLERS, requested_quantity=None):
+def has_foreign_currency(mapping):
+    """Есть ли среди найденных офферов цены не в BASE_CURRENCY (тогда для сравнения нужны курсы)."""
+    for data in mapping.values():
+        for part in data["results"].values():
+            for offer in part.get("offers") or []:
+                for price in offer.get("prices") or []:
+                    if (price.get("currency") or BASE_CURRENCY).upper() != BASE_CURRENCY:
+                        return True
+    return False
+
+
+def process_part(part, original_mpn, found_mpn, ALLOWED_SELLERS, requested_quantity=None, target_currency=None, rates=None):
 
     output_records = []
 
@@ -200,6 +220,8 @@ def process_part(part, original_mpn, found_mpn, ALLOWED_SELLERS, requested_quant
     description = descriptions[0]["text"] if descriptions and isinstance(descriptions[0], dict) else None
 
 
+    rates = rates or {}
+
     # === Проходим всех продавцов ===
     offers = part.get("offers") or []
 
@@ -222,6 +244,7 @@ def process_part(part, original_mpn, found_mpn, ALLOWED_SELLERS, requested_quant
         prices = offer.get("prices") or []
 
         price_breaks = []
+        base_prices = []
 
         for price in prices:
             try:
@@ -239,20 +262,35 @@ def process_part(part, original_mpn, found_mpn, ALLOWED_SELLERS, requested_quant
             cost_with_delivery = target_price_purchasing + delivery_coef
             target_price_sales = target_price_purchasing + delivery_coef + markup
 
-            price_breaks.append({
+            price_break = {
                 "quantity": offer_quantity,
                 "price": base_price,
                 "currency": currency,
                 "target_price_purchasing": round(target_price_purchasing, 2),
                 "cost_with_delivery": round(cost_with_delivery, 2),
                 "target_price_sales": round(target_price_sales, 2)
-            })
+            }
+
+            # Ценовые ступени могут приходить в разных валютах — переводим каждую отдельно
+            if target_currency:
+                price_converted = convert(base_price, currency, target_currency, rates)
+                price_break["price_converted"] = round(price_converted, 2) if price_converted is not None else None
+                price_break["currency_converted"] = target_currency
+
+            price_breaks.append(price_break)
+            # Для выбора лучшей цены все ступени приводятся к BASE_CURRENCY
+            base_prices.append(convert(base_price, currency, BASE_CURRENCY, rates))
 
         # если нет валидных цен — пропускаем оффер
         if not price_breaks:
             continue
 
-        best_price = min(price_breaks, key=lambda x: x["price"])
+        # Ступени с неизвестным курсом в сравнении не участвуют
+        comparable = [(bp, pb) for bp, pb in zip(base_prices, price_breaks) if bp is not None]
+        if comparable:
+            best_price = min(comparable, key=lambda x: x[0])[1]
+        else:
+            best_price = min(price_breaks, key=lambda x: x["price"])
 
         output_records.append({
             "requested_mpn": original_mpn,
@@ -270,6 +308,8 @@ def process_part(part, original_mpn, found_mpn, ALLOWED_SELLERS, requested_quant
             "priceBreaks": price_breaks,
             "price": best_price["price"],
             "currency": best_price["currency"],
+            "price_converted": best_price.get("price_converted"),
+            "currency_converted": target_currency,
 
             "category_id": category_id,
             "category_name": category_name,
@@ -295,37 +335,10 @@ def process_part(part, original_mpn, found_mpn, ALLOWED_SELLERS, requested_quant
     return output_records
 
 
-def get_usd_to_rub_rate_cached():
-    url = "https://api.exchangerate.host/latest?base=USD&symbols=RUB"
-    r = requests.get(url, timeout=5)
-    rate = r.json()["rates"]["RUB"]
-    get_usd_to_rub_rate_cached.last_update = time.time()
-    return rate
-
-USD_RUB_RATE = None
-USD_RUB_LAST_UPDATE = 0
-
-def get_usd_to_rub_rate(logger):
-    global USD_RUB_RATE, USD_RUB_LAST_UPDATE
-    now = time.time()
-    # обновляем не чаще, чем раз в 6 часов
-    if not USD_RUB_RATE or now - USD_RUB_LAST_UPDATE > 6 * 3600:
-        try:
-            url = "https://api.exchangerate.host/latest?base=USD&symbols=RUB"
-            r = requests.get(url, timeout=5)
-            USD_RUB_RATE = r.json()["rates"]["RUB"]
-            USD_RUB_LAST_UPDATE = now
-            logger.info(f"Курс USD→RUB обновлён: {USD_RUB_RATE}")
-        except Exception as e:
-            logger.error(f"Ошибка при получении курса валют: {e}")
-            # fallback на старый курс
-            USD_RUB_RATE = USD_RUB_RATE or 100.0
-    return USD_RUB_RATE
-
 logger = logging.getLogger(__name__)
 
 # НОВАЯ функция для RQ-задачи
-def run_nexar_task(mpn_list, mode):
+def run_nexar_task(mpn_list, mode, currency=None):
     """
     Синхронная обертка для асинхронной логики,
     которая будет запускаться RQ воркером.
@@ -336,7 +349,7 @@ def run_nexar_task(mpn_list, mode):
 
     # Запуск асинхронной логики
     try:
-        results = asyncio.run(process_all_mpn(mpn_list, mode, task_logger))
+        results = asyncio.run(process_all_mpn(mpn_list, mode, task_logger, currency=currency))
         return {
             "status": "COMPLETED",
             "result": results
@@ -1,6 +1,7 @@
 import sys
 from rq import Worker, SimpleWorker
 from redis_config import redis_conn
+from services.fx_service import start_fx_refresher
 
 if __name__ == '__main__':
     queues = ['search_mpn']
@@ -13,5 +14,8 @@ if __name__ == '__main__':
         print("=== Запуск в режиме Linux/Unix (Standard Worker) ===")
         worker_class = Worker
 
+    # Курсы валют обновляются в фоне и хранятся в Redis, задачи только читают их
+    start_fx_refresher()
+
     worker = worker_class(queues, connection=redis_conn)
     worker.work()
\ No newline at end of file